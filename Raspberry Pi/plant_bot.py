@@ -1,15 +1,13 @@
 #!/usr/bin/env python3
 import os
-import serial
+import serial_asyncio
 import time
+import io
 import asyncio
-import subprocess
-from datetime import datetime
 from pathlib import Path
 import numpy as np
 from PIL import Image
-import tensorflow as tf
-from tensorflow.lite.python.interpreter import Interpreter
+from tflite_runtime.interpreter import Interpreter
 from telegram import Update, InputFile
 from telegram.ext import Application, CommandHandler, ContextTypes
 
@@ -18,12 +16,12 @@ from telegram.ext import Application, CommandHandler, ContextTypes
 # ============================================================
 TOKEN = ":)"
 BASE = Path("your own dir/plantbot")
-MODEL_PATH = BASE / "plant_classifier_fp16.tflite"
+MODEL_PATH = BASE / "plant_classifier_int8.tflite"   # full-int8 export from notebooks/fasdlas.ipynb
 LABELS_PATH = BASE / "labels.txt"
-PHOTOS_DIR = BASE / "photos"
-PHOTOS_DIR.mkdir(exist_ok=True)
 
 IMG_SIZE = 224
+CAPTURE_SIZE = (320, 240)   # smallest 4:3 frame covering IMG_SIZE; ISP does the downscale
+NUM_THREADS = os.cpu_count() or 4   # XNNPACK threads for invoke()
 SERIAL_PORT = "your arduino's serial port"
 BAUD = 115200
 # ============================================================
@@ -31,13 +29,72 @@ BAUD = 115200
 # ------------------------------------------------------------
 # Arduino Serial Setup
 # ------------------------------------------------------------
-ser = None
+reader = writer = None
+SERIAL_LOCK = asyncio.Lock()   # one command/reply exchange at a time
+
+async def open_serial(app: Application):
+    """Open the Arduino port on the bot's event loop (post_init hook)."""
+    global reader, writer
+    try:
+        reader, writer = await serial_asyncio.open_serial_connection(url=SERIAL_PORT, baudrate=BAUD)
+        print(f"✅ Connected to Arduino at {SERIAL_PORT}")
+        await asyncio.sleep(2)
+    except Exception as e:
+        print(f"⚠️ Arduino not connected: {e}")
+
+def serial_connected() -> bool:
+    return writer is not None and not writer.is_closing()
+
+async def serial_request(cmd: bytes, done, timeout: float) -> list:
+    """Send cmd, then collect reply lines until done(line) or timeout."""
+    lines = []
+    async with SERIAL_LOCK:
+        # drop the periodic sensor logs queued since the last command
+        while True:
+            try:
+                if not await asyncio.wait_for(reader.readline(), 0.05):
+                    break   # EOF
+            except asyncio.TimeoutError:
+                break
+
+        writer.write(cmd)
+        await writer.drain()
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while (remaining := deadline - loop.time()) > 0:
+            try:
+                raw = await asyncio.wait_for(reader.readline(), remaining)
+            except asyncio.TimeoutError:
+                break
+            if not raw:
+                break   # EOF
+            line = raw.decode(errors="ignore").strip()
+            if not line:
+                continue
+            lines.append(line)
+            if done(line):
+                break
+    return lines
+
+# ------------------------------------------------------------
+# Camera Setup (kept open so scans skip libcamera start-up)
+# ------------------------------------------------------------
+picam = None
 try:
-    ser = serial.Serial(SERIAL_PORT, BAUD, timeout=2)
-    print(f"✅ Connected to Arduino at {SERIAL_PORT}")
-    time.sleep(2)
+    from picamera2 import Picamera2   # apt package python3-picamera2
+    picam = Picamera2()
+    # "BGR888" is libcamera's name for R,G,B byte order, i.e. an RGB numpy array
+    picam.configure(picam.create_still_configuration(
+        main={"size": CAPTURE_SIZE, "format": "BGR888"}
+    ))
+    picam.set_controls({"AwbEnable": True, "Brightness": 0.55, "Contrast": 1.0, "Saturation": 1.0})
+    picam.start()
+    print("✅ Camera started")
+    time.sleep(2)   # let AE/AWB settle once
 except Exception as e:
-    print(f"⚠️ Arduino not connected: {e}")
+    picam = None
+    print(f"⚠️ Camera not available: {e}")
 
 # ------------------------------------------------------------
 # Load Labels
@@ -45,64 +102,72 @@ except Exception as e:
 classes = [ln.strip() for ln in open(LABELS_PATH) if ln.strip()]
 print(f"✅ Loaded {len(classes)} classes")
 
+# ------------------------------------------------------------
+# Load TFLite model once (reused across scans)
+# ------------------------------------------------------------
+INTERPRETER = Interpreter(model_path=str(MODEL_PATH), num_threads=NUM_THREADS)
+INTERPRETER.allocate_tensors()
+IN_DET = INTERPRETER.get_input_details()[0]
+OUT_DET = INTERPRETER.get_output_details()[0]
+IN_INDEX = IN_DET["index"]
+OUT_INDEX = OUT_DET["index"]
+IN_DTYPE = IN_DET["dtype"]
+OUT_SCALE, OUT_ZERO = OUT_DET["quantization"]   # (0.0, 0) for float outputs
+print(f"✅ Loaded model {MODEL_PATH.name} (input dtype: {IN_DTYPE}, threads: {NUM_THREADS})")
+
+# Scratch input buffer, filled in place on every scan
+INPUT_BUF = np.empty((1, IMG_SIZE, IMG_SIZE, 3), dtype=IN_DTYPE)
+
+# Warm-up: the first invoke() pays for XNNPACK delegation and weight packing,
+# so do it now rather than on the first /scan
+INTERPRETER.set_tensor(IN_INDEX, np.zeros_like(INPUT_BUF))
+INTERPRETER.invoke()
+print("✅ Interpreter warmed up")
+
+# Telegram handlers are async; serialize access to the shared interpreter
+INFER_LOCK = asyncio.Lock()
+
 # ------------------------------------------------------------
 # Capture photo safely
 # ------------------------------------------------------------
-def capture_photo() -> Path:
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    raw_path = PHOTOS_DIR / f"raw_{timestamp}.jpg"
-    resized_path = PHOTOS_DIR / f"plant_{timestamp}_224.jpg"
-
-    cmd = [
-        "rpicam-still",
-        "-o", str(raw_path),
-        "--width", "1296",
-        "--height", "972",
-        "--awb", "auto",
-        "--brightness", "0.55",
-        "--contrast", "1.0",
-        "--saturation", "1.0",
-        "--timeout", "2500",
-        "--nopreview"
-    ]
-    print(f"📸 Capturing to {raw_path}")
-    result = subprocess.run(cmd)
-    if result.returncode != 0:
-        raise RuntimeError("Camera capture failed (timeout or hardware issue)")
-
-    img = Image.open(raw_path).convert("RGB").resize((IMG_SIZE, IMG_SIZE))
-    img.save(resized_path)
-    raw_path.unlink(missing_ok=True)
-    print(f"✅ Saved resized image: {resized_path}")
-    return resized_path
+def capture_photo():
+    """Return the 224x224 frame as an RGB array plus a JPEG copy for Telegram."""
+    if picam is None:
+        raise RuntimeError("Camera not available")
+
+    print("📸 Capturing frame")
+    try:
+        frame = picam.capture_array("main")
+    except Exception as e:
+        raise RuntimeError(f"Camera capture failed: {e}")
+
+    img = Image.fromarray(frame).resize((IMG_SIZE, IMG_SIZE))
+    arr = np.asarray(img)
+    bio = io.BytesIO()
+    img.save(bio, "JPEG", quality=85)
+    bio.seek(0)
+    return arr, bio
 
 # ------------------------------------------------------------
 # Classify image
 # ------------------------------------------------------------
-def classify_image(path: Path):
-    print(f"🔍 Classifying {path}")
-    img = Image.open(path).convert("RGB").resize((IMG_SIZE, IMG_SIZE))
-    arr = np.array(img)
-
-    interpreter = Interpreter(model_path=str(MODEL_PATH))
-    interpreter.allocate_tensors()
-    in_det = interpreter.get_input_details()[0]
-    out_det = interpreter.get_output_details()[0]
-    dtype = in_det["dtype"]
-    print(f"📊 Model input dtype: {dtype}")
+def classify_image(arr: np.ndarray):
+    print("🔍 Classifying frame")
 
-    if dtype == np.uint8:
-        arr = np.expand_dims(arr.astype(np.uint8), 0)
-    else:
-        arr = np.expand_dims(arr.astype(np.float32), 0)
-        from tensorflow.keras.applications.mobilenet_v3 import preprocess_input
-        arr = preprocess_input(arr)
+    # uint8 models take pixels as-is; float32 models get the same [0,255]
+    # values (MobileNetV3 rescales to [-1,1] inside the model)
+    np.copyto(INPUT_BUF[0], arr, casting="unsafe")
 
-    interpreter.set_tensor(in_det["index"], arr)
-    interpreter.invoke()
-    out = interpreter.get_tensor(out_det["index"])[0]
+    INTERPRETER.set_tensor(IN_INDEX, INPUT_BUF)
+    INTERPRETER.invoke()
+    out = INTERPRETER.get_tensor(OUT_INDEX)[0]
+    if OUT_SCALE:
+        # dequantize uint8 scores back to probabilities
+        out = (out.astype(np.float32) - OUT_ZERO) * OUT_SCALE
 
-    top_idx = np.argsort(out)[-3:][::-1]
+    k = min(3, out.size)
+    top_idx = np.argpartition(out, -k)[-k:]
+    top_idx = top_idx[np.argsort(out[top_idx])[::-1]]
     preds = [(classes[i], float(out[i])) for i in top_idx]
 
     print("✅ Predictions:")
@@ -113,10 +178,10 @@ def classify_image(path: Path):
 # ------------------------------------------------------------
 # Escape for Telegram MarkdownV2
 # ------------------------------------------------------------
+_ESC_TABLE = str.maketrans({ch: "\\" + ch for ch in r"_*[]()~`>#+-=|{}.!%"})
+
 def esc(t: str) -> str:
-    for ch in r"_*[]()~`>#+-=|{}.!%":
-        t = t.replace(ch, "\\" + ch)
-    return t
+    return t.translate(_ESC_TABLE)
 
 # ============================================================
 # Telegram Command Handlers
@@ -130,16 +195,17 @@ async def start(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
 async def scan(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
     try:
         await update.message.reply_text("📸 Capturing image, please wait...")
-        photo_path = capture_photo()
-        preds = classify_image(photo_path)
+        # capture and inference block, so run them off the event loop
+        arr, photo = await asyncio.to_thread(capture_photo)
+        async with INFER_LOCK:
+            preds = await asyncio.to_thread(classify_image, arr)
 
         caption = "🔍 *Top 3 predictions:*\n"
         for n, p in preds:
             caption += f"• {esc(n)} — {esc(f'{p*100:.2f}%')}\n"
         caption += f"\n🌱 *Most likely:* {esc(preds[0][0])}"
 
-        with open(photo_path, "rb") as f:
-            await update.message.reply_photo(photo=InputFile(f), caption=caption, parse_mode="MarkdownV2")
+        await update.message.reply_photo(photo=InputFile(photo, filename="plant.jpg"), caption=caption, parse_mode="MarkdownV2")
 
     except RuntimeError as e:
         await update.message.reply_text(f"❌ Camera error: {e}")
@@ -150,39 +216,32 @@ async def scan(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
 # /status command
 # ------------------------------------------------------------
 async def status(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
-    if not ser or not ser.is_open:
+    if not serial_connected():
         await update.message.reply_text("⚠️ Arduino not connected.")
         return
 
-    ser.reset_input_buffer()
-    ser.write(b"STATUS\n")
     await update.message.reply_text("📟 Requesting plant status...")
+    lines = await serial_request(b"STATUS\n", lambda ln: ln.startswith("SENS%"), timeout=2)
 
-    await asyncio.sleep(1)
-    reply = ser.read_all().decode(errors="ignore").strip()
-    if not reply:
-        reply = "⚠️ No response from Arduino."
+    reply = lines[-1] if lines else "⚠️ No response from Arduino."
     await update.message.reply_text(f"📊 {reply}")
 
 # ------------------------------------------------------------
 # /water command
 # ------------------------------------------------------------
 async def water(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
-    if not ser or not ser.is_open:
+    if not serial_connected():
         await update.message.reply_text("⚠️ Arduino not connected.")
         return
 
-    ser.reset_input_buffer()
-    ser.write(b"PUMP\n")
     await update.message.reply_text("💧 Watering started...")
+    lines = await serial_request(b"PUMP\n", lambda ln: ln == "ACK:PUMP_DONE", timeout=10)
+    acks = [ln for ln in lines if not ln.startswith("SENS%")]
 
-    await asyncio.sleep(4)
-    reply = ser.read_all().decode(errors="ignore").strip()
-
-    if "ACK:PUMP_DONE" in reply:
+    if "ACK:PUMP_DONE" in acks:
         await update.message.reply_text("✅ Watering complete!")
-    elif reply:
-        await update.message.reply_text(f"📟 {reply}")
+    elif acks:
+        await update.message.reply_text(f"📟 {' '.join(acks)}")
     else:
         await update.message.reply_text("✅ Done (no serial response).")
 
@@ -190,7 +249,8 @@ async def water(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
 # Main entry
 # ------------------------------------------------------------
 def main():
-    app = Application.builder().token(TOKEN).build()
+    # concurrent_updates: /status and /water are not queued behind a running /scan
+    app = Application.builder().token(TOKEN).post_init(open_serial).concurrent_updates(True).build()
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("scan", scan))
     app.add_handler(CommandHandler("status", status))
@@ -21,6 +21,7 @@ args = parser.parse_args()
 # --------------------------------------------------------
 with open(args.labels, "r", encoding="utf-8") as f:
     classes = [line.strip() for line in f.readlines() if line.strip()]
+classes_lower = tuple(c.lower() for c in classes)   # for --prefer matching
 print(f"✅ Loaded {len(classes)} classes")
 
 # --------------------------------------------------------
@@ -39,52 +40,62 @@ print(f"✅ Model input shape: {input_shape}, dtype: {input_dtype}")
 # --------------------------------------------------------
 # 🌿 Load and preprocess the image
 # --------------------------------------------------------
-img = Image.open(args.image).convert("RGB").resize((IMG_SIZE, IMG_SIZE))
+img = Image.open(args.image)
+img.draft("RGB", (IMG_SIZE, IMG_SIZE))  # JPEGs decode at a reduced DCT scale
+if img.mode != "RGB":
+    img = img.convert("RGB")
+img = img.resize((IMG_SIZE, IMG_SIZE))
 if args.brighten != 1.0:
     img = ImageEnhance.Brightness(img).enhance(args.brighten)
 
-img_np = np.array(img)
+img_np = np.asarray(img)  # no extra copy; copied once into input_data below
 
 # Preprocess based on dtype
-if input_dtype == np.float32:
-    img_np = tf.keras.applications.mobilenet_v3.preprocess_input(
-        np.expand_dims(img_np.astype(np.float32), axis=0)
-    )
-elif input_dtype == np.uint8:
-    img_np = np.expand_dims(img_np.astype(np.uint8), axis=0)
-else:
+# (mobilenet_v3.preprocess_input is a pass-through: the model rescales to
+# [-1,1] itself, so both dtypes take raw [0,255] pixels)
+if input_dtype not in (np.float32, np.uint8):
     raise ValueError(f"Unsupported input dtype: {input_dtype}")
+input_data = np.empty(input_shape, dtype=input_dtype)
+np.copyto(input_data[0], img_np, casting="unsafe")
 
 # --------------------------------------------------------
 # 🚀 Run inference
 # --------------------------------------------------------
-interpreter.set_tensor(input_details[0]["index"], img_np)
+interpreter.set_tensor(input_details[0]["index"], input_data)
 interpreter.invoke()
 output = interpreter.get_tensor(output_details[0]["index"])[0]
+out_scale, out_zero = output_details[0]["quantization"]
+if out_scale:
+    # int8 models emit quantized scores; dequantize before post-processing
+    output = (output.astype(np.float32) - out_zero) * out_scale
 
 # --------------------------------------------------------
 # 🎛️ Apply temperature scaling
 # --------------------------------------------------------
 if args.temp != 1.0:
-    logits = np.log(output + 1e-9)
-    exp_logits = np.exp(logits / args.temp)
-    output = exp_logits / np.sum(exp_logits)
+    # softmax(log(p) / T), max-subtracted for stability, computed in place
+    logits = np.log(output + 1e-9) / args.temp
+    logits -= logits.max()
+    output = np.exp(logits, out=logits)
+    output /= output.sum()
 
 # --------------------------------------------------------
 # 💡 Apply bias boost if desired
 # --------------------------------------------------------
 if args.prefer:
     prefer_lower = args.prefer.lower()
-    for i, cls in enumerate(classes):
-        if prefer_lower in cls.lower():
+    for i, cls in enumerate(classes_lower):
+        if prefer_lower in cls:
             output[i] *= (1.0 + args.boost)
-            print(f"🌿 Applied +{int(args.boost*100)}% boost to class '{cls}'")
+            print(f"🌿 Applied +{int(args.boost*100)}% boost to class '{classes[i]}'")
 output = output / np.sum(output)
 
 # --------------------------------------------------------
 # 📊 Display results
 # --------------------------------------------------------
-top5 = np.argsort(output)[-5:][::-1]
+k = min(5, output.size)
+top5 = np.argpartition(output, -k)[-k:]
+top5 = top5[np.argsort(output[top5])[::-1]]
 print("\n🔍 Top-5 Predictions:")
 for i in top5:
     print(f"  {classes[i]:35s} : {output[i]:.4f}")